@@ -1,19 +1,45 @@
-import json
+import asyncio
+import os
+import re
+import signal
 import subprocess
+import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from core import json_compat
 from core.llm_client import LLMClient
+from core.shell_session import ShellSession, ShellSessionError
 from tools.system_info import (
     get_file_tree,
     check_port_in_use,
     get_disk_space,
     check_file_exists,
     get_platform_info,
-    build_shell_command,
+    build_shell_prefix,
+    get_unix_shell,
 )
 from tools.man_pages import get_man_page, get_command_help
 from tools.file_ops import read_config_file, check_write_permission
 from tools.validation import validate_command_safety
 
+# JSON object/array inside a ``` or ```json fence
+_FENCE_RE = re.compile(r"```(?:json)?\s*(\{.*?\}|\[.*?\])\s*```", re.DOTALL)
+# Content that starts like a bare JSON document
+_BARE_JSON_RE = re.compile(r"\s*[\{\[]")
+
+# Tool results larger than this are cut down before entering the conversation
+MAX_TOOL_BYTES = 16 * 1024
+TOOL_HEAD_BYTES = 8 * 1024
+TOOL_TAIL_BYTES = 4 * 1024
+
+# How long to keep reading output after a command's shell has exited. Anything
+# still holding the pipe open past this is a background child of the command.
+OUTPUT_DRAIN_SECONDS = 2
+
+# Buffered diagnostic lines are flushed at natural boundaries or after this many
+OUTPUT_FLUSH_LINES = 50
+
 # Tool function mapping
 TOOL_FUNCTIONS = {
     "get_man_page": get_man_page,
@@ -26,7 +52,9 @@ TOOL_FUNCTIONS = {
     "check_write_permission": check_write_permission,
 }
 
-# Tool definitions for LLM
+# Tool definitions for LLM. Built once at import and passed by reference on every
+# chat() call; litellm serializes the request body itself and has no option to
+# accept pre-serialized tool JSON, so there is nothing further to cache here.
 TOOL_DEFINITIONS = [
     {
         "type": "function",
@@ -145,14 +173,69 @@ TOOL_DEFINITIONS = [
 ]
 
 
+def _cap_tool_result(result):
+    """Replace an oversized tool result with its head and tail so prompts stay small"""
+    raw = json_compat.dumps(result).encode()
+    if len(raw) <= MAX_TOOL_BYTES:
+        return result
+    
+    return {
+        "_truncated": True,
+        "head": raw[:TOOL_HEAD_BYTES].decode(errors='replace'),
+        "tail": raw[-TOOL_TAIL_BYTES:].decode(errors='replace'),
+        "total_bytes": len(raw)
+    }
+
+
+async def _run_command_async(shell_prefix, cmd, semaphore, timeout):
+    """Run one command in its own shell, returning (returncode, output)"""
+    async with semaphore:
+        proc = await asyncio.create_subprocess_exec(
+            *shell_prefix, cmd,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT
+        )
+        try:
+            stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        return proc.returncode, stdout.decode(errors='replace')
+
+
+async def _gather_commands(shell_prefix, commands, timeout, limit=8):
+    """Run commands concurrently; failures are returned in place of results"""
+    semaphore = asyncio.Semaphore(limit)
+    return await asyncio.gather(
+        *(_run_command_async(shell_prefix, cmd, semaphore, timeout) for cmd in commands),
+        return_exceptions=True
+    )
+
+
 class CommandExecutor:
     def __init__(self, llm_client: LLMClient):
         self.llm_client = llm_client
         self.max_iterations = 10  # Prevent infinite loops
+        self.command_timeout_seconds = 300  # Per-command limit
+        self.total_budget_seconds = 600  # Limit for a whole batch of commands
+        # argv that runs a command string in the user's shell; only the command varies
+        self._shell_prefix = build_shell_prefix(get_platform_info())
+        # Diagnostic lines waiting to be written to stdout in one go. The lock is
+        # shared with output reader threads, which may outlive their command.
+        self._out = []
+        self._out_lock = threading.RLock()
     
     def execute_quick_task(self, task_description, auto_confirm=False, dry_run=False):
         """Execute a single-step task"""
-        print(f"\n🎯 Task: {task_description}\n")
+        try:
+            self._run_quick_task(task_description, auto_confirm, dry_run)
+        finally:
+            self._flush_output()
+    
+    def _run_quick_task(self, task_description, auto_confirm, dry_run):
+        self._emit(f"\n🎯 Task: {task_description}\n")
         
         # Get platform information
         platform_info = get_platform_info()
@@ -173,21 +256,30 @@ IMPORTANT: Generate commands appropriate for the {platform_info.get('platform',
         
         # Start conversation with LLM
         iteration = 0
+        prev_signature = None
         while iteration < self.max_iterations:
             iteration += 1
             
             # Get LLM response
+            self._flush_output()
             try:
                 response = self.llm_client.chat(
                     context if iteration == 1 else "Continue with the task.",
                     tools=TOOL_DEFINITIONS
                 )
             except Exception as e:
-                print(f"❌ Error communicating with LLM: {e}")
+                self._emit(f"❌ Error communicating with LLM: {e}")
                 return
             
             message = response.choices[0].message
             
+            # Stop if the model repeats itself (same tool calls / same empty reply)
+            signature = self._response_signature(message)
+            if signature == prev_signature:
+                self._emit("⚠️  LLM made no progress since the last turn. Stopping.")
+                return
+            prev_signature = signature
+            
             # Check if LLM wants to use tools
             if hasattr(message, 'tool_calls') and message.tool_calls:
                 self._handle_tool_calls(message.tool_calls)
@@ -201,61 +293,78 @@ IMPORTANT: Generate commands appropriate for the {platform_info.get('platform',
                     self._execute_commands(result, auto_confirm, dry_run)
                     return
                 else:
-                    print(f"💬 {message.content}")
+                    self._emit(f"💬 {message.content}")
                     return
         
-        print("⚠️  Maximum iterations reached. Task may be incomplete.")
+        self._emit("⚠️  Maximum iterations reached. Task may be incomplete.")
+    
+    @staticmethod
+    def _response_signature(message):
+        """Identify an LLM turn by its tool calls and text, to detect stalled loops"""
+        tool_calls = getattr(message, 'tool_calls', None) or []
+        return (
+            tuple((tc.function.name, tc.function.arguments) for tc in tool_calls),
+            message.content or ''
+        )
     
     def _handle_tool_calls(self, tool_calls):
-        """Execute tool calls and add results to conversation"""
+        """Execute tool calls concurrently and add results to conversation"""
         for tool_call in tool_calls:
-            function_name = tool_call.function.name
-            arguments = json.loads(tool_call.function.arguments)
-            
-            # Rate limiting: small delay between tool calls to avoid overwhelming the API
-            delay = getattr(self.llm_client, 'tool_call_delay_seconds', 0.5)
-            time.sleep(delay)
-            
-            print(f"🔧 Calling tool: {function_name}({json.dumps(arguments, indent=2)})")
+            self._emit(f"🔧 Calling tool: {tool_call.function.name}({tool_call.function.arguments})")
+        
+        self._flush_output()
+        
+        # Tools are independent local I/O calls, so run them side by side
+        with ThreadPoolExecutor(max_workers=min(8, len(tool_calls))) as pool:
+            results = list(pool.map(self._run_one_tool, tool_calls))
+        
+        # Add results in the original order to keep the conversation deterministic
+        for tool_call_id, function_name, result in results:
+            if result is None:
+                self._emit(f"⚠️  Unknown tool: {function_name}")
+                continue
             
-            # Execute the tool
-            if function_name in TOOL_FUNCTIONS:
-                try:
-                    result = TOOL_FUNCTIONS[function_name](**arguments)
-                    print(f"✅ Tool result received\n")
-                    
-                    # Add tool result to conversation
-                    self.llm_client.add_tool_response(
-                        tool_call.id,
-                        function_name,
-                        result
-                    )
-                except Exception as e:
-                    error_result = {"error": str(e)}
-                    print(f"❌ Tool error: {e}\n")
-                    self.llm_client.add_tool_response(
-                        tool_call.id,
-                        function_name,
-                        error_result
-                    )
+            if isinstance(result, dict) and 'error' in result:
+                self._emit(f"❌ Tool error ({function_name}): {result['error']}\n")
             else:
-                print(f"⚠️  Unknown tool: {function_name}")
+                self._emit(f"✅ Tool result received: {function_name}\n")
+            
+            self.llm_client.add_tool_response(
+                tool_call_id,
+                function_name,
+                result
+            )
+    
+    def _run_one_tool(self, tool_call):
+        """Run a single tool call, returning (tool_call_id, name, result)"""
+        function_name = tool_call.function.name
+        if function_name not in TOOL_FUNCTIONS:
+            return tool_call.id, function_name, None
+        
+        try:
+            arguments = json_compat.loads(tool_call.function.arguments)
+            result = TOOL_FUNCTIONS[function_name](**arguments)
+            # Capping serializes the result, so unencodable results fail here too
+            result = _cap_tool_result(result)
+        except Exception as e:
+            result = {"error": str(e)}
+        
+        return tool_call.id, function_name, result
     
     def _parse_llm_response(self, content):
         """Parse LLM response for commands"""
-        # Try to extract JSON from the response
+        # Prefer a fenced ```json / ``` block, otherwise try the whole content
+        match = _FENCE_RE.search(content)
+        if match:
+            json_str = match.group(1)
+        elif _BARE_JSON_RE.match(content):
+            json_str = content.strip()
+        else:
+            return None
+        
         try:
-            # Look for JSON code block
-            if "```json" in content:
-                json_str = content.split("```json")[1].split("```")[0].strip()
-                return json.loads(json_str)
-            elif "```" in content:
-                json_str = content.split("```")[1].split("```")[0].strip()
-                return json.loads(json_str)
-            else:
-                # Try parsing the whole content as JSON
-                return json.loads(content)
-        except:
+            return json_compat.loads(json_str)
+        except json_compat.JSONDecodeError:
             return None
     
     def _execute_commands(self, result, auto_confirm, dry_run):
@@ -266,66 +375,207 @@ IMPORTANT: Generate commands appropriate for the {platform_info.get('platform',
         requires_confirmation = result.get('requires_confirmation', True)
         
         if explanation:
-            print(f"📋 Explanation:\n{explanation}\n")
+            self._emit(f"📋 Explanation:\n{explanation}\n")
         
         if warnings:
-            print("⚠️  Warnings:")
+            self._emit("⚠️  Warnings:")
             for warning in warnings:
-                print(f"  - {warning}")
-            print()
+                self._emit(f"  - {warning}")
+            self._emit('')
         
-        print("📝 Commands to execute:")
+        self._emit("📝 Commands to execute:")
         for i, cmd in enumerate(commands, 1):
-            print(f"  {i}. {cmd}")
-        print()
+            self._emit(f"  {i}. {cmd}")
+        self._emit('')
         
         if dry_run:
-            print("🔍 Dry run mode - not executing commands")
+            self._emit("🔍 Dry run mode - not executing commands")
             return
         
         # Validate command safety
+        safety_checks = []
         for cmd in commands:
             safety_check = validate_command_safety(cmd)
             if not safety_check['safe']:
-                print(f"🛑 Safety check failed: {safety_check['reason']}")
+                self._emit(f"🛑 Safety check failed: {safety_check['reason']}")
                 return
+            safety_checks.append(safety_check)
         
         # Ask for confirmation
         if requires_confirmation and not auto_confirm:
+            self._flush_output()
             response = input("Execute these commands? (y/N): ")
             if response.lower() != 'y':
-                print("❌ Cancelled by user")
+                self._emit("❌ Cancelled by user")
                 return
         
         # Execute commands
-        print("\n🚀 Executing commands...\n")
+        self._emit("\n🚀 Executing commands...\n")
         # Show shell being used for transparency
         pi = get_platform_info()
-        print(f"Using shell: {pi.get('shell', 'unknown')} ({pi.get('shell_type', '')}) on {pi.get('platform', 'unknown platform')}\n")
-        for i, cmd in enumerate(commands, 1):
-            print(f"[{i}/{len(commands)}] Running: {cmd}")
-            try:
-                # Build proper shell command based on platform/shell
-                run_cmd = build_shell_command(cmd)
-                result = subprocess.run(
-                    run_cmd,
-                    shell=False,
-                    capture_output=True,
-                    text=True,
-                    timeout=300
-                )
-                
-                if result.stdout:
-                    print(result.stdout)
-                if result.stderr:
-                    print(f"stderr: {result.stderr}")
+        self._emit(f"Using shell: {pi.get('shell', 'unknown')} ({pi.get('shell_type', '')}) on {pi.get('platform', 'unknown platform')}\n")
+        
+        # One shell process serves every command on POSIX shells
+        shell = get_unix_shell() if pi.get('platform') != 'Windows' else None
+        session = ShellSession(shell) if ShellSession.is_supported(shell) else None
+        # Every command's timeout is clamped to what is left of one task-wide budget
+        deadline = time.monotonic() + self.total_budget_seconds
+        completed = 0
+        try:
+            # Consecutive read-only commands run concurrently; everything else runs in order
+            for group in self._group_commands(commands, safety_checks):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._emit(f"⏱️  Time budget of {self.total_budget_seconds} seconds used up")
+                    break
+                timeout = min(self.command_timeout_seconds, max(1, remaining))
                 
-                if result.returncode != 0:
-                    print(f"⚠️  Command exited with code {result.returncode}")
+                if len(group) > 1:
+                    stop = self._run_parallel(group, len(commands), timeout)
                 else:
-                    print(f"✅ Success\n")
-                    
-            except subprocess.TimeoutExpired:
-                print(f"⏱️  Command timed out after 300 seconds")
-            except Exception as e:
-                print(f"❌ Error: {e}")
+                    i, cmd, safety_check = group[0]
+                    self._emit(f"[{i}/{len(commands)}] Running: {cmd}")
+                    self._flush_output()
+                    stop = False
+                    try:
+                        returncode = self._run_command(cmd, session, safety_check, timeout)
+                        self._print_status(returncode)
+                    except subprocess.TimeoutExpired:
+                        self._emit(f"⏱️  Command timed out after {timeout:.0f} seconds")
+                        stop = True
+                    except ShellSessionError as e:
+                        # The command never ran; later ones would only retry the same start
+                        self._emit(f"❌ Could not start shell session: {e}")
+                        completed = i - 1
+                        break
+                    except Exception as e:
+                        self._emit(f"❌ Error: {e}")
+                
+                completed = group[-1][0]
+                if stop:
+                    break
+        except BaseException:
+            # Interrupted mid-command: don't leave it running
+            if session:
+                session.close()
+            raise
+        if session:
+            # Let commands' intentional background jobs outlive the session
+            session.shutdown()
+        
+        if completed < len(commands):
+            self._emit(f"⏭️  Skipped {len(commands) - completed} remaining command(s)")
+    
+    @staticmethod
+    def _group_commands(commands, safety_checks):
+        """
+        Split commands into ordered groups of (index, cmd, safety_check).
+        Runs of side-effect-free commands share a group; every other command is alone.
+        """
+        groups = []
+        for i, (cmd, safety_check) in enumerate(zip(commands, safety_checks), 1):
+            entry = (i, cmd, safety_check)
+            if safety_check.get('side_effect_free') and groups and groups[-1][-1][2].get('side_effect_free'):
+                groups[-1].append(entry)
+            else:
+                groups.append([entry])
+        return groups
+    
+    def _run_parallel(self, group, total, timeout):
+        """
+        Run read-only commands concurrently, then print their output in order.
+        Returns True if any of them timed out.
+        """
+        self._emit(f"Running {len(group)} read-only commands in parallel...")
+        self._flush_output()
+        results = asyncio.run(_gather_commands(self._shell_prefix, [cmd for _, cmd, _ in group], timeout))
+        
+        timed_out = False
+        for (i, cmd, _), result in zip(group, results):
+            self._emit(f"[{i}/{total}] Running: {cmd}")
+            if isinstance(result, subprocess.TimeoutExpired):
+                self._emit(f"⏱️  Command timed out after {timeout:.0f} seconds")
+                timed_out = True
+            elif isinstance(result, Exception):
+                self._emit(f"❌ Error: {result}")
+            else:
+                returncode, output = result
+                if output:
+                    self._print_output(output if output.endswith('\n') else output + '\n')
+                self._print_status(returncode)
+        return timed_out
+    
+    def _print_status(self, returncode):
+        if returncode != 0:
+            self._emit(f"⚠️  Command exited with code {returncode}")
+        else:
+            self._emit(f"✅ Success\n")
+    
+    def _run_command(self, cmd, session, safety_check, timeout):
+        """Run one command, printing its output as it arrives. Returns the exit code."""
+        if session and not safety_check.get('requires_isolation'):
+            return session.run(cmd, timeout=timeout, on_output=self._print_output)
+        
+        run_cmd = self._shell_prefix + [cmd]
+        # Own process group, so a timeout can kill everything the command started.
+        # Not for elevation commands: a new session has no controlling terminal,
+        # so sudo/su could no longer open /dev/tty to ask for a password.
+        own_group = os.name == 'posix' and not safety_check.get('requires_isolation')
+        proc = subprocess.Popen(
+            run_cmd,
+            shell=False,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            start_new_session=own_group
+        )
+        # Read on a separate thread so the timeout still applies while output trickles in
+        reader = threading.Thread(target=self._pump_output, args=(proc.stdout,), daemon=True)
+        reader.start()
+        deadline = time.monotonic() + timeout
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self._kill_process(proc, own_group)
+            raise
+        # Background children can keep the pipe open after the shell exits; don't wait on them
+        reader.join(timeout=max(0, min(OUTPUT_DRAIN_SECONDS, deadline - time.monotonic())))
+        return proc.returncode
+    
+    @staticmethod
+    def _kill_process(proc, own_group):
+        """Kill a command started by _run_command, with its process group if it has one"""
+        if own_group:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        else:
+            proc.kill()
+        proc.wait()
+    
+    def _emit(self, line):
+        """Queue a line of output; lines are written to stdout in batches"""
+        with self._out_lock:
+            self._out.append(line)
+            if len(self._out) >= OUTPUT_FLUSH_LINES:
+                self._flush_output()
+    
+    def _flush_output(self):
+        """Write queued lines to stdout with a single write"""
+        with self._out_lock:
+            if self._out:
+                lines, self._out = self._out, []
+                sys.stdout.write("\n".join(lines) + "\n")
+                sys.stdout.flush()
+    
+    def _pump_output(self, stream):
+        for line in stream:
+            self._print_output(line if line.endswith('\n') else line + '\n')
+    
+    def _print_output(self, line):
+        # Hold the lock across both writes so queued lines stay ahead of this one
+        with self._out_lock:
+            self._flush_output()
+            print(line, end='', flush=True)
@@ -0,0 +1,28 @@
+# JSON helpers that use orjson when it is installed, falling back to the stdlib
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+if orjson is not None:
+    def loads(data):
+        """Parse JSON from a str or bytes"""
+        return orjson.loads(data)
+
+    def dumps(obj):
+        """Serialize obj to a compact JSON string"""
+        return orjson.dumps(obj).decode()
+else:
+    def loads(data):
+        """Parse JSON from a str or bytes"""
+        return json.loads(data)
+
+    def dumps(obj):
+        """Serialize obj to a compact JSON string"""
+        return json.dumps(obj, separators=(',', ':'))
+
+# orjson.JSONDecodeError subclasses this, so callers can catch it either way
+JSONDecodeError = json.JSONDecodeError
@@ -1,45 +1,98 @@
+import httpx
 import litellm
 import yaml
-import json
 import os
 import time
+from functools import lru_cache
 from pathlib import Path
 
+from core import json_compat
+
+# libyaml-backed loader when PyYAML was built with it, pure-Python otherwise
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+PROJECT_ROOT = Path(__file__).parent.parent
+PROMPTS_DIR = PROJECT_ROOT / 'prompts'
+
+
+@lru_cache(maxsize=4)
+def _read_config(path, mtime_ns):
+    """Parse a config file; mtime_ns is part of the cache key so edits are picked up"""
+    with open(path, 'r') as f:
+        return yaml.load(f, Loader=_YamlLoader)
+
+
+@lru_cache(maxsize=4)
+def _read_prompt(path, mtime_ns):
+    """Read a prompt file; mtime_ns is part of the cache key so edits are picked up"""
+    with open(path, 'r') as f:
+        return f.read()
+
+
+@lru_cache(maxsize=1)
+def _get_http_client():
+    """Process-wide pooled HTTP client so requests reuse TCP/TLS connections"""
+    limits = httpx.Limits(max_keepalive_connections=10, keepalive_expiry=120)
+    try:
+        return httpx.Client(http2=True, limits=limits, timeout=60.0)
+    except ImportError:
+        # HTTP/2 needs the optional h2 package; keep-alive still works over HTTP/1.1
+        return httpx.Client(limits=limits, timeout=60.0)
+
+
+def _load_config(path):
+    """Load config, re-parsing only when the file has changed"""
+    return _read_config(str(path), os.stat(path).st_mtime_ns)
+
+
+def _load_prompt(name):
+    """Load a prompt from the prompts directory, re-reading only when it has changed"""
+    path = PROMPTS_DIR / name
+    return _read_prompt(str(path), os.stat(path).st_mtime_ns)
+
+
 class LLMClient:
     def __init__(self, config_path='config.yaml'):
         """Initialize LiteLLM client with configuration"""
-        config_file = Path(__file__).parent.parent / config_path
-        
-        with open(config_file, 'r') as f:
-            config = yaml.safe_load(f)
+        config = _load_config(PROJECT_ROOT / config_path)
         
         self.model = config.get('model', 'gpt-4o-mini')
         self.temperature = config.get('temperature', 0.2)
         self.max_tokens = config.get('max_tokens', 4096)
-        self.rate_limit_seconds = config.get('rate_limit_seconds', 7)
-        self.tool_call_delay_seconds = config.get('tool_call_delay_seconds', 0.5)
+        # Minimum gap between requests; falls back to the legacy rate_limit_seconds key
+        self.min_interval_seconds = config.get('min_interval_seconds', config.get('rate_limit_seconds', 0))
+        self.rate_limit_max_retries = config.get('rate_limit_max_retries', 5)
+        self.rate_limit_backoff_seconds = config.get('rate_limit_backoff_seconds', 2)
+        self.rate_limit_max_backoff_seconds = config.get('rate_limit_max_backoff_seconds', 60)
+        self._last_call_ts = 0.0
+        # Cap on stored messages so prompts don't grow without bound (0 disables)
+        self.history_max_messages = config.get('history_max_messages', 20)
         
         # Set API key from config or environment
         api_key = config.get('api_key')
         if api_key and api_key != 'YOUR_API_KEY_HERE':
             litellm.api_key = api_key
         
-        # Load system prompt
-        prompt_file = Path(__file__).parent.parent / 'prompts' / 'system_prompt.txt'
-        with open(prompt_file, 'r') as f:
-            self.system_prompt = f.read()
+        # Share one connection pool across every client and call in the process
+        if litellm.client_session is None:
+            litellm.client_session = _get_http_client()
+        
+        # Load prompts once so chat() only picks between in-memory strings
+        self.system_prompt = _load_prompt('system_prompt.txt')
+        self.planning_prompt = _load_prompt('planner_prompt.txt')
         
         self.conversation_history = []
     
-    def chat(self, user_message, tools=None, use_planning_mode=False):
-        """Send message to LLM with optional tool definitions"""
-        if use_planning_mode:
-            # Load planning prompt
-            prompt_file = Path(__file__).parent.parent / 'prompts' / 'planner_prompt.txt'
-            with open(prompt_file, 'r') as f:
-                system_prompt = f.read()
-        else:
-            system_prompt = self.system_prompt
+    def chat(self, user_message, tools=None, use_planning_mode=False, on_token=None):
+        """
+        Send message to LLM with optional tool definitions.
+        When no tools are offered and on_token is given, the response is streamed
+        and on_token is called with each text chunk as it arrives.
+        """
+        system_prompt = self.planning_prompt if use_planning_mode else self.system_prompt
         
         messages = [
             {"role": "system", "content": system_prompt},
@@ -48,9 +101,6 @@ class LLMClient:
         ]
         
         try:
-            # Rate limiting: wait before API request to avoid rate limiting
-            time.sleep(self.rate_limit_seconds)
-            
             kwargs = {
                 "model": self.model,
                 "messages": messages,
@@ -62,7 +112,10 @@ class LLMClient:
                 kwargs["tools"] = tools
                 kwargs["tool_choice"] = "auto"
             
-            response = litellm.completion(**kwargs)
+            if on_token and not tools:
+                response = self._stream_completion(kwargs, on_token)
+            else:
+                response = self._completion_with_backoff(kwargs)
             
             # Store in conversation history
             self.conversation_history.append({"role": "user", "content": user_message})
@@ -73,20 +126,73 @@ class LLMClient:
                 "content": assistant_message.content or "",
                 "tool_calls": assistant_message.tool_calls if hasattr(assistant_message, 'tool_calls') else None
             })
+            self.conversation_history = self._trim(self.conversation_history, self.history_max_messages)
             
             return response
         
         except Exception as e:
             raise Exception(f"LiteLLM error: {str(e)}")
     
+    def _completion_with_backoff(self, kwargs):
+        """Call litellm, spacing requests and backing off only on rate-limit errors"""
+        attempt = 0
+        while True:
+            # Only wait for whatever is left of the minimum interval since the last call
+            wait = self.min_interval_seconds - (time.monotonic() - self._last_call_ts)
+            if wait > 0:
+                time.sleep(wait)
+            
+            self._last_call_ts = time.monotonic()
+            try:
+                return litellm.completion(**kwargs)
+            except litellm.RateLimitError:
+                if attempt >= self.rate_limit_max_retries:
+                    raise
+                backoff = min(self.rate_limit_backoff_seconds * (2 ** attempt), self.rate_limit_max_backoff_seconds)
+                print(f"⏳ Rate limited by provider, retrying in {backoff}s...")
+                time.sleep(backoff)
+                attempt += 1
+    
+    def _stream_completion(self, kwargs, on_token):
+        """Stream a completion, forwarding text chunks, and rebuild the full response"""
+        chunks = []
+        for chunk in self._completion_with_backoff({**kwargs, "stream": True}):
+            chunks.append(chunk)
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                on_token(delta)
+        return litellm.stream_chunk_builder(chunks, messages=kwargs["messages"])
+    
     def add_tool_response(self, tool_call_id, function_name, result):
         """Add tool execution result to conversation"""
         self.conversation_history.append({
             "role": "tool",
             "tool_call_id": tool_call_id,
             "name": function_name,
-            "content": json.dumps(result)
+            "content": json_compat.dumps(result)
         })
+        self.conversation_history = self._trim(self.conversation_history, self.history_max_messages)
+    
+    @staticmethod
+    def _trim(history, max_messages):
+        """
+        Keep the opening user message (the task itself) plus the most recent turns.
+        The kept tail always starts at a user message so tool results are never
+        separated from the assistant message that requested them.
+        """
+        if max_messages <= 0 or len(history) <= max_messages:
+            return history
+        
+        tail_start = len(history) - (max_messages - 1)
+        for idx in range(max(tail_start, 1), len(history)):
+            if history[idx]["role"] == "user":
+                return history[:1] + history[idx:]
+        
+        # The current turn alone exceeds the cap; keep it whole
+        for idx in range(len(history) - 1, 0, -1):
+            if history[idx]["role"] == "user":
+                return history[:1] + history[idx:]
+        return history
     
     def reset_conversation(self):
         """Clear conversation history"""
@@ -1,4 +1,3 @@
-import json
 from core.llm_client import LLMClient
 from core.executor import CommandExecutor, TOOL_DEFINITIONS
 from tools.system_info import get_platform_info
@@ -93,22 +92,20 @@ Output your plan in this JSON format:
 """
         
         try:
+            # Stream the plan so progress is visible while the model is still writing
             response = self.llm_client.chat(
                 planning_prompt,
-                use_planning_mode=True
+                use_planning_mode=True,
+                on_token=lambda text: print(text, end='', flush=True)
             )
+            print("\n")
             
             content = response.choices[0].message.content
             
             # Parse the plan
-            if "```json" in content:
-                json_str = content.split("```json")[1].split("```")[0].strip()
-                plan = json.loads(json_str)
-            elif "```" in content:
-                json_str = content.split("```")[1].split("```")[0].strip()
-                plan = json.loads(json_str)
-            else:
-                plan = json.loads(content)
+            plan = self.executor._parse_llm_response(content)
+            if plan is None:
+                raise ValueError("LLM response did not contain a valid JSON plan")
             
             return plan
             
@@ -0,0 +1,160 @@
+import os
+import queue
+import shlex
+import signal
+import subprocess
+import threading
+import time
+import uuid
+
+# Shells that understand the ( ... ) / printf / $? syntax used below
+POSIX_SHELLS = {'bash', 'zsh', 'sh', 'dash', 'ksh'}
+
+
+class ShellSessionError(Exception):
+    """The session shell could not be started"""
+
+
+class ShellSession:
+    """
+    A long-lived shell process that runs commands one after another.
+    Avoids paying process spawn and login-profile startup for every command.
+    Each command still runs in its own subshell, so `cd`, `export`, `exit`
+    etc. do not leak into the next command.
+    """
+
+    def __init__(self, shell):
+        self.shell = shell
+        self._proc = None
+        self._lines = None
+        self._marker = f"__CAN_YOU_END_{uuid.uuid4().hex}__"
+
+    @staticmethod
+    def is_supported(shell):
+        """Check whether a shell path can host a persistent session"""
+        return bool(shell) and os.path.basename(shell) in POSIX_SHELLS
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self, timeout):
+        """
+        Spawn the shell and drain anything its login profile prints.
+        Raises ShellSessionError if it isn't ready within timeout seconds.
+        """
+        self._proc = subprocess.Popen(
+            [self.shell, '-l'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            # Own process group so a timeout can kill the command, not just the shell.
+            # Safe here: session commands read /dev/null and sudo/su never use the session.
+            start_new_session=True
+        )
+        self._lines = queue.Queue()
+        reader = threading.Thread(target=self._read_output, args=(self._proc.stdout, self._lines), daemon=True)
+        reader.start()
+
+        self._send(f"printf '%s%d\\n' '{self._marker}' 0\n")
+        try:
+            if self._collect(timeout, lambda line: None) == -1:
+                raise ShellSessionError(f"{self.shell} exited during startup")
+        except subprocess.TimeoutExpired:
+            self.close()
+            raise ShellSessionError(f"{self.shell} did not start within {timeout:.0f} seconds")
+
+    def run(self, cmd, timeout, on_output):
+        """
+        Run a command in the session, passing each output line to on_output
+        as soon as it arrives (stderr is merged into stdout).
+        Returns the exit code.
+        Raises subprocess.TimeoutExpired if the command does not finish in time,
+        or ShellSessionError if the shell had to be (re)started and couldn't be.
+        Starting the shell counts against the same timeout.
+        """
+        deadline = time.monotonic() + timeout
+        if self._proc is None or self._proc.poll() is not None:
+            self.start(timeout)
+            timeout = max(0, deadline - time.monotonic())
+
+        # Pass the command as quoted data to eval so unbalanced quotes or parens
+        # fail inside the subshell with a normal exit code instead of breaking the session
+        self._send(f"( eval {shlex.quote(cmd)} ) < /dev/null 2>&1\nprintf '%s%d\\n' '{self._marker}' $?\n")
+        try:
+            return self._collect(timeout, on_output)
+        except subprocess.TimeoutExpired:
+            self.close()
+            raise subprocess.TimeoutExpired(cmd, timeout)
+
+    def close(self):
+        """Kill the shell and every command still running in its process group"""
+        if self._proc is None:
+            return
+        try:
+            os.killpg(self._proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self._proc.wait()
+        self._proc = None
+
+    def shutdown(self):
+        """
+        End the session once all commands have finished. The shell exits on EOF,
+        so anything the commands deliberately started in the background keeps running.
+        """
+        if self._proc is None:
+            return
+        try:
+            self._proc.stdin.close()
+            self._proc.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.close()
+            return
+        self._proc = None
+
+    def _send(self, script):
+        try:
+            self._proc.stdin.write(script)
+            self._proc.stdin.flush()
+        except (BrokenPipeError, OSError):
+            # Shell died; the reader will report EOF
+            pass
+
+    def _collect(self, timeout, on_output):
+        """Forward output lines until the end marker arrives"""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(self.shell, timeout)
+            try:
+                line = self._lines.get(timeout=remaining)
+            except queue.Empty:
+                raise subprocess.TimeoutExpired(self.shell, timeout)
+
+            if line is None:
+                # EOF: the shell exited underneath us
+                self._proc.wait()
+                self._proc = None
+                return -1
+
+            idx = line.find(self._marker)
+            if idx == -1:
+                on_output(line)
+                continue
+
+            # Output without a trailing newline shares the line with the marker
+            if idx > 0:
+                on_output(line[:idx] + '\n')
+            return int(line[idx + len(self._marker):].strip() or -1)
+
+    @staticmethod
+    def _read_output(stream, lines):
+        for line in stream:
+            lines.put(line)
+        lines.put(None)
@@ -0,0 +1,73 @@
+import os
+import shutil
+import subprocess
+import time
+
+import pytest
+
+from core.shell_session import ShellSession, ShellSessionError
+
+pytestmark = pytest.mark.skipif(
+    os.name != 'posix' or not shutil.which('sh'),
+    reason="persistent shell sessions need a POSIX sh"
+)
+
+
+def _is_running(pid):
+    """True if pid exists and is not a zombie waiting to be reaped"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except FileNotFoundError:
+        return False
+    except OSError:
+        return True
+
+
+def _wait_until_gone(pid, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not _is_running(pid):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_run_returns_exit_code_and_output():
+    lines = []
+    with ShellSession(shutil.which('sh')) as session:
+        assert session.run('echo hi; exit 3', timeout=10, on_output=lines.append) == 3
+    assert lines == ['hi\n']
+
+
+def test_syntax_error_is_a_normal_failure():
+    with ShellSession(shutil.which('sh')) as session:
+        assert session.run('echo "x', timeout=10, on_output=lambda line: None) != 0
+        assert session.run('true', timeout=10, on_output=lambda line: None) == 0
+
+
+def test_timed_out_command_is_killed():
+    lines = []
+    session = ShellSession(shutil.which('sh'))
+    # exec replaces the inner shell, so the printed pid is the sleep itself
+    with pytest.raises(subprocess.TimeoutExpired):
+        session.run("sh -c 'echo $$; exec sleep 30'", timeout=1, on_output=lines.append)
+
+    pid = int(lines[0])
+    assert _wait_until_gone(pid), f"sleep (pid {pid}) survived the timeout"
+
+
+def test_slow_startup_counts_against_the_timeout(tmp_path, monkeypatch):
+    # A login shell reads ~/.profile; make it hang
+    (tmp_path / '.profile').write_text('sleep 30\n')
+    monkeypatch.setenv('HOME', str(tmp_path))
+
+    session = ShellSession(shutil.which('sh'))
+    started = time.monotonic()
+    with pytest.raises(ShellSessionError):
+        session.run('true', timeout=1, on_output=lambda line: None)
+    assert time.monotonic() - started < 5
@@ -0,0 +1,78 @@
+import pytest
+
+from tools.validation import is_side_effect_free, validate_command_safety
+
+
+# Commands that must never be treated as read-only: they are allowed to run
+# concurrently and out of order, so a false positive can race with writes
+NOT_SIDE_EFFECT_FREE = [
+    'env rm -rf /tmp/x',
+    'ls\nrm -rf /tmp/x',
+    'ls /tmp\ntouch /tmp/x',
+    'find . -fprint out',
+    'find . -fprint0 out',
+    'find . -fprintf out %p',
+    'find . -fls out',
+    'find . -delete',
+    'find . -exec rm {} +',
+    'find . -okdir rm {} ;',
+    'date -s 2020-01-01',
+    'hostname newname',
+    'uniq in out',
+    'uniq -c in out',
+    'uniq -f 1 in out',
+    'tree -o file',
+    'sort -o out in',
+    'sort -oout in',
+    'sort --output=out in',
+    'sort --compress-program=rm in',
+    'sort -uo out in',
+    'sort -ro out in',
+    'sort -k2 -no out in',
+    'cat <(touch /tmp/x)',
+    'grep x <(touch /tmp/x)',
+    "awk -i inplace '{print}' f",
+    "awk -iinplace '{print}' f",
+    "awk --include=inplace '{print}' f",
+    'ss -K dst 10.0.0.1',
+    'ls > out',
+    'echo $(rm x)',
+    'echo `rm x`',
+    "awk 'BEGIN { system(\"rm x\") }'",
+    'ls && rm x',
+    'ls; touch x',
+    'ls &',
+    'FOO=1 ls',
+    'xargs rm',
+    'mkdir x',
+    '',
+]
+
+SIDE_EFFECT_FREE = [
+    'ls -la /etc',
+    'cat a | grep b',
+    'ps aux | sort -k3 | head',
+    'uniq in',
+    'uniq -f 1 in',
+    'sort -k2 in | uniq -c',
+    'sort -u -r in',
+    "awk '{print $1}' f",
+    'find . -name "*.pdf"',
+    'tree -L 2',
+    'df -h && du -sh .',
+]
+
+
+@pytest.mark.parametrize('command', NOT_SIDE_EFFECT_FREE)
+def test_not_side_effect_free(command):
+    assert is_side_effect_free(command) is False
+
+
+@pytest.mark.parametrize('command', SIDE_EFFECT_FREE)
+def test_side_effect_free(command):
+    assert is_side_effect_free(command) is True
+
+
+def test_validate_command_safety_reports_side_effects():
+    assert validate_command_safety('ls /tmp')['side_effect_free'] is True
+    assert validate_command_safety('env touch /tmp/x')['side_effect_free'] is False
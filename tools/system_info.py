@@ -2,6 +2,7 @@ import os
 import subprocess
 import platform
 import shutil
+from functools import lru_cache
 from pathlib import Path
 
 
@@ -173,8 +174,12 @@ def get_system_info():
         return {"error": f"Error getting system info: {str(e)}"}
 
 
+@lru_cache(maxsize=1)
 def get_platform_info():
-    """Get OS and shell information for command generation context"""
+    """
+    Get OS and shell information for command generation context.
+    Cached since it can't change within a process; treat the result as read-only.
+    """
     info = {}
     
     # Detect OS
@@ -258,12 +263,20 @@ def build_shell_command(cmd: str):
     """
     Build a subprocess command list that executes the given string `cmd`
     using the user's detected shell on the current platform.
+    See build_shell_prefix for the shapes produced.
+    """
+    return build_shell_prefix(get_platform_info()) + [cmd]
+
 
-    - Windows PowerShell: [pwsh|powershell, -NoProfile, -ExecutionPolicy Bypass, -Command, cmd]
-    - Windows cmd: [cmd, /c, cmd]
-    - Unix-like (Linux/macOS): [SHELL or /bin/bash, -lc, cmd]
+def build_shell_prefix(info):
+    """
+    Build the argv prefix that, with a command string appended, runs it
+    in the shell described by `info` (as returned by get_platform_info).
+
+    - Windows PowerShell: [pwsh|powershell, -NoProfile, -ExecutionPolicy Bypass, -Command]
+    - Windows cmd: [cmd, /c]
+    - Unix-like (Linux/macOS): [SHELL or /bin/bash, -lc]
     """
-    info = get_platform_info()
     system = info.get('platform') or platform.system()
 
     if system == 'Windows':
@@ -276,12 +289,16 @@ def build_shell_command(cmd: str):
 
         if 'PowerShell' in shell_type or shell_type.lower() == 'powershell':
             exe = pwsh_path or powershell_path or 'powershell'
-            return [exe, '-NoProfile', '-ExecutionPolicy', 'Bypass', '-Command', cmd]
+            return [exe, '-NoProfile', '-ExecutionPolicy', 'Bypass', '-Command']
         else:
             # Fallback to cmd
             cmd_exe = shutil.which('cmd') or 'cmd'
-            return [cmd_exe, '/c', cmd]
+            return [cmd_exe, '/c']
     else:
         # Unix-like: use login shell if available, else bash
-        shell = os.environ.get('SHELL') or shutil.which('bash') or '/bin/sh'
-        return [shell, '-lc', cmd]
+        return [get_unix_shell(), '-lc']
+
+
+def get_unix_shell():
+    """Path of the user's shell on Unix-like systems, falling back to bash or sh"""
+    return os.environ.get('SHELL') or shutil.which('bash') or '/bin/sh'
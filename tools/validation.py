@@ -1,38 +1,81 @@
 import re
+from functools import lru_cache
+from types import MappingProxyType
 # bunch of fucking danger shit, hardcoding shit that I KNOW will fuck shit up
 
+# Commands that only read state; safe to run concurrently with each other.
+# Deliberately excludes command runners (env, xargs) and tools with setter
+# forms (date -s, hostname NAME) or write flags not covered below (file -C, less -o).
+READ_ONLY_COMMANDS = {
+    'ls', 'cat', 'head', 'tail', 'grep', 'egrep', 'fgrep', 'find', 'wc', 'stat',
+    'du', 'df', 'free', 'uptime', 'ps', 'pwd', 'whoami', 'id', 'uname',
+    'which', 'whereis', 'type', 'echo', 'printenv', 'lsblk', 'lscpu',
+    'ss', 'netstat', 'sort', 'uniq', 'cut', 'tr', 'awk', 'tree',
+}
+
+# uniq options that take a value, so the value isn't counted as a file argument
+UNIQ_VALUE_OPTIONS = {'-f', '-s', '-w'}
+
+# Anything that writes, spawns arbitrary code, or needs a prompt disqualifies a command
+SIDE_EFFECT_PATTERNS = [re.compile(p) for p in [
+    r'>',  # redirection to a file
+    r'\$\(', r'`',  # command substitution
+    r'<\(',  # process substitution (>( is caught by the redirection check)
+    r'-delete\b', r'-exec\b', r'-execdir\b', r'-ok\b', r'-okdir\b',  # find actions
+    r'-fprint\b', r'-fprint0\b', r'-fprintf\b', r'-fls\b',  # find writing to a file
+    r'\bsystem\s*\(',  # awk system()
+    r'\bsort\b[^|;&\n]*\s(-[A-Za-z]*o\S*|--output\S*|--compress-program\S*)',  # sort writing a file (incl. -uo) / running a program
+    r'\bawk\b[^|;&\n]*\s(-i\S*|--include\S*)',  # gawk -i inplace edits files
+    r'\btree\b[^|;&\n]*\s-o\b',  # tree writing to a file
+    r'\bss\b[^|;&\n]*\s(-K|--kill)\b',  # ss killing sockets
+]]
+
+# Splits a command line into pipeline/list stages (newlines separate commands too)
+COMMAND_SEPARATOR_RE = re.compile(r'\|\||&&|[|;&\n]')
+
+DANGEROUS_PATTERNS = [re.compile(p, re.IGNORECASE) for p in [
+    r'\brm\s+-rf\s+/',  # rm -rf / variations
+    r'\brm\s+-fr\s+/',
+    r'\bdd\s+if=/dev/zero\s+of=/dev/',  # dd to disk device
+    r':\(\)\s*{\s*:\|:&\s*};:',  # Fork bomb
+    r'>\s*/dev/sd[a-z]',  # Writing to disk devices
+    r'\bmkfs\.',  # Format filesystem
+    r'\bfdisk\b',  # Partition manipulation
+    r'\bcryptsetup\b',  # Disk encryption
+    r'\bchmod\s+-R\s+777\s+/',  # Dangerous permissions
+    r'\bchown\s+-R.*\s+/',  # Recursive ownership change on /
+]]
+
+ELEVATION_RE = re.compile(r'\b(sudo|su\s)')
+
+
+@lru_cache(maxsize=1024)
 def validate_command_safety(command):
     """
     Validate if a command is safe to execute.
     Checks for dangerous patterns and operations.
+    Results are cached per command string and returned read-only.
     """
-    dangerous_patterns = [
-        r'\brm\s+-rf\s+/',  # rm -rf / variations
-        r'\brm\s+-fr\s+/',
-        r'\bdd\s+if=/dev/zero\s+of=/dev/',  # dd to disk device
-        r':\(\)\s*{\s*:\|:&\s*};:',  # Fork bomb
-        r'>\s*/dev/sd[a-z]',  # Writing to disk devices
-        r'\bmkfs\.',  # Format filesystem
-        r'\bfdisk\b',  # Partition manipulation
-        r'\bcryptsetup\b',  # Disk encryption
-        r'\bchmod\s+-R\s+777\s+/',  # Dangerous permissions
-        r'\bchown\s+-R.*\s+/',  # Recursive ownership change on /
-    ]
-    
+    return MappingProxyType(_check_command_safety(command))
+
+
+def _check_command_safety(command):
     # Check for dangerous patterns
-    for pattern in dangerous_patterns:
-        if re.search(pattern, command, re.IGNORECASE):
+    for pattern in DANGEROUS_PATTERNS:
+        if pattern.search(command):
             return {
                 "safe": False,
-                "reason": f"Command contains dangerous pattern: {pattern}",
+                "reason": f"Command contains dangerous pattern: {pattern.pattern}",
                 "command": command
             }
     
     # Warn about sudo/root operations
-    if re.search(r'\b(sudo|su\s)', command):
+    if ELEVATION_RE.search(command):
         return {
             "safe": True,
             "requires_elevation": True,
+            "requires_isolation": True,  # may prompt for a password, so run it on its own
+            "side_effect_free": False,
             "warning": "Command requires elevated privileges",
             "command": command
         }
@@ -45,15 +88,51 @@ def validate_command_safety(command):
                 "safe": True,
                 "warning": f"Command modifies system directory: {sysdir}",
                 "requires_caution": True,
+                "side_effect_free": False,
                 "command": command
             }
     
     return {
         "safe": True,
+        "side_effect_free": is_side_effect_free(command),
         "command": command
     }
 
 
+def is_side_effect_free(command):
+    """
+    Check whether a command only reads system state.
+    Every stage of a pipeline/list must be a known read-only command.
+    """
+    for pattern in SIDE_EFFECT_PATTERNS:
+        if pattern.search(command):
+            return False
+    
+    for segment in COMMAND_SEPARATOR_RE.split(command):
+        parts = segment.split()
+        if not parts or parts[0] not in READ_ONLY_COMMANDS:
+            return False
+        # `uniq INPUT OUTPUT` writes OUTPUT
+        if parts[0] == 'uniq' and _count_operands(parts[1:], UNIQ_VALUE_OPTIONS) > 1:
+            return False
+    
+    return True
+
+
+def _count_operands(args, value_options):
+    """Count non-option arguments, skipping the values of options that take one"""
+    count = 0
+    skip = False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg in value_options:
+            skip = True
+        elif arg == '-' or not arg.startswith('-'):
+            count += 1
+    return count
+
+
 def parse_command_intent(command):
     """
     Parse a command to understand what it does.
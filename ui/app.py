@@ -4,8 +4,11 @@ from __future__ import annotations
 
 import contextlib
 import io
+import queue
 import sys
+import threading
 from pathlib import Path
+from typing import Iterator
 
 import streamlit as st
 
@@ -19,12 +22,46 @@ from core.llm_client import LLMClient
 from core.planner import LongTaskPlanner
 
 
-def run_task(task: str, use_long: bool, auto_confirm: bool, dry_run: bool) -> str:
-    """Execute the underlying CLI logic while capturing stdout/stderr."""
-    buffer = io.StringIO()
+@st.cache_resource
+def get_llm_client() -> LLMClient:
+    """Process-wide LLM client shared across reruns and sessions."""
+    return LLMClient()
 
-    with contextlib.redirect_stdout(buffer), contextlib.redirect_stderr(buffer):
-        llm_client = LLMClient()
+
+@st.cache_resource
+def get_run_lock() -> threading.Lock:
+    """Serialize tasks, since the shared client holds the conversation history."""
+    return threading.Lock()
+
+
+class _QueueWriter(io.TextIOBase):
+    """File-like object that forwards everything written to a queue."""
+
+    def __init__(self, chunks: queue.Queue):
+        self._chunks = chunks
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        if s:
+            self._chunks.put(s)
+        return len(s)
+
+
+def run_task(
+    task: str,
+    use_long: bool,
+    auto_confirm: bool,
+    dry_run: bool,
+    out: io.TextIOBase,
+    llm_client: LLMClient,
+    run_lock: threading.Lock,
+) -> None:
+    """Execute the underlying CLI logic, sending stdout/stderr to `out`."""
+    with run_lock, contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+        # Start each task from a clean history so requests don't leak into each other
+        llm_client.reset_conversation()
         if use_long:
             planner = LongTaskPlanner(llm_client)
             planner.execute_long_task(task, auto_confirm, dry_run)
@@ -32,7 +69,44 @@ def run_task(task: str, use_long: bool, auto_confirm: bool, dry_run: bool) -> st
             executor = CommandExecutor(llm_client)
             executor.execute_quick_task(task, auto_confirm, dry_run)
 
-    return buffer.getvalue()
+
+def stream_task(task: str, use_long: bool, auto_confirm: bool, dry_run: bool) -> Iterator[str]:
+    """Run the task on a worker thread, yielding output as soon as it is printed."""
+    chunks: queue.Queue = queue.Queue()
+    errors: list[Exception] = []
+    # Resolve cached resources here; st.cache_resource needs the script thread
+    llm_client = get_llm_client()
+    run_lock = get_run_lock()
+
+    def worker() -> None:
+        try:
+            run_task(task, use_long, auto_confirm, dry_run, _QueueWriter(chunks), llm_client, run_lock)
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            chunks.put(None)
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+
+    done = False
+    while not done:
+        parts = [chunks.get()]
+        # Coalesce whatever else is already queued into a single UI update
+        while True:
+            try:
+                parts.append(chunks.get_nowait())
+            except queue.Empty:
+                break
+        if None in parts:
+            done = True
+            parts = parts[: parts.index(None)]
+        if parts:
+            yield "".join(parts)
+
+    thread.join()
+    if errors:
+        raise errors[0]
 
 
 st.set_page_config(page_title="AI Command Helper", page_icon="🛠️", layout="wide")
@@ -59,10 +133,12 @@ if run_btn:
     else:
         with st.spinner("Working..."):
             try:
-                output = run_task(task_description.strip(), use_long, auto_confirm, dry_run)
-                if output:
-                    st.code(output, language="bash")
-                else:
+                placeholder = st.empty()
+                output = ""
+                for chunk in stream_task(task_description.strip(), use_long, auto_confirm, dry_run):
+                    output += chunk
+                    placeholder.code(output, language="bash")
+                if not output:
                     st.info("No output returned.")
             except Exception as exc:  # surface any unexpected errors
                 st.error(f"Error: {exc}")